@@ -1,6 +1,7 @@
 import sqlite3
 import os
 import time
+import threading
 import config
 
 DATABASE_PATH = config.DATABASE_PATH
@@ -13,7 +14,7 @@ CREATE TABLE IF NOT EXISTS songs (
     title       TEXT NOT NULL DEFAULT '',
     artist      TEXT NOT NULL DEFAULT '未知艺术家',
     album       TEXT NOT NULL DEFAULT '未知专辑',
-    file_size   TEXT DEFAULT '0 MB',
+    file_bytes  INTEGER DEFAULT 0,
     file_mtime  REAL DEFAULT 0,
     has_cover   INTEGER DEFAULT 0,
     has_lyrics  INTEGER DEFAULT 0,
@@ -24,6 +25,7 @@ CREATE TABLE IF NOT EXISTS songs (
     title_sort     TEXT DEFAULT '',
     artist_sort    TEXT DEFAULT '',
     album_sort     TEXT DEFAULT '',
+    cache_name     TEXT DEFAULT '',
 
     updated_at  REAL DEFAULT (strftime('%s','now'))
 );
@@ -53,12 +55,24 @@ CREATE TABLE IF NOT EXISTS covers (
 
 CREATE INDEX IF NOT EXISTS idx_covers_path ON covers(song_path);
 
+-- 刮削未找到歌词或封面的记录：一段时间内后台刮削跳过这些歌曲
+CREATE TABLE IF NOT EXISTS scrape_misses (
+    cache_name TEXT PRIMARY KEY,
+    missed_at  REAL NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS meta (
     key   TEXT PRIMARY KEY,
     value TEXT
 );
 """
 
+# 旧版本数据库缺少的列：init_db 时自动 ALTER TABLE 补齐
+SONG_COLUMN_MIGRATIONS = {
+    "file_bytes": "INTEGER DEFAULT 0",
+    "cache_name": "TEXT DEFAULT ''",
+}
+
 SORT_COLUMNS = {
     "title": "title_sort",
     "artist": "artist_sort",
@@ -67,18 +81,38 @@ SORT_COLUMNS = {
 }
 
 
-def get_conn():
-    conn = sqlite3.connect(DATABASE_PATH)
+def get_conn(check_same_thread=True):
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
+# 歌曲表数据版本号：每次增删改歌曲后递增，供上层判断内存缓存是否失效
+# 索引线程与多个刮削线程都会递增，加锁避免丢失更新
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def _bump_data_version():
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+
+
+def get_data_version():
+    return _data_version
+
+
 def init_db():
     conn = get_conn()
     try:
         conn.executescript(SCHEMA_SQL)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(songs)")}
+        for column, ddl in SONG_COLUMN_MIGRATIONS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE songs ADD COLUMN {column} {ddl}")
         conn.commit()
     finally:
         conn.close()
@@ -90,26 +124,33 @@ def row_to_song(row):
     return dict(row)
 
 
+def _song_filter(search, sort_by, sort_order):
+    """返回 (WHERE 子句, 参数, ORDER BY 子句)"""
+    sort_col = SORT_COLUMNS.get(sort_by, "title_sort")
+    direction = "ASC" if sort_order == "asc" else "DESC"
+
+    params = []
+    where = ""
+    if search:
+        where = (
+            "WHERE filename LIKE ? OR title LIKE ? "
+            "OR artist LIKE ? OR album LIKE ?"
+        )
+        s = f"%{search}%"
+        params = [s, s, s, s]
+
+    return where, params, f"ORDER BY {sort_col} {direction}"
+
+
 def query_songs(search="", sort_by="title", sort_order="asc", page=1, page_size=0):
     conn = get_conn()
     try:
-        sort_col = SORT_COLUMNS.get(sort_by, "title_sort")
-        direction = "ASC" if sort_order == "asc" else "DESC"
-
-        params = []
-        where = ""
-        if search:
-            where = (
-                "WHERE filename LIKE ? OR title LIKE ? "
-                "OR artist LIKE ? OR album LIKE ?"
-            )
-            s = f"%{search}%"
-            params = [s, s, s, s]
+        where, params, order_by = _song_filter(search, sort_by, sort_order)
 
         count_sql = f"SELECT COUNT(*) FROM songs {where}"
         total = conn.execute(count_sql, params).fetchone()[0]
 
-        sql = f"SELECT * FROM songs {where} ORDER BY {sort_col} {direction}"
+        sql = f"SELECT * FROM songs {where} {order_by}"
         if page_size > 0:
             offset = (page - 1) * page_size
             sql += f" LIMIT {page_size} OFFSET {offset}"
@@ -120,6 +161,28 @@ def query_songs(search="", sort_by="title", sort_order="asc", page=1, page_size=
         conn.close()
 
 
+ITER_SONGS_BATCH = 500
+
+
+def iter_songs(search="", sort_by="title", sort_order="asc"):
+    """
+    逐批读取歌曲行的生成器，不把整个结果集一次载入内存
+    流式响应会在线程池的不同线程中推进生成器，因此连接不做同线程检查（同一时刻只有一个线程使用）
+    """
+    conn = get_conn(check_same_thread=False)
+    try:
+        where, params, order_by = _song_filter(search, sort_by, sort_order)
+        cursor = conn.execute(f"SELECT * FROM songs {where} {order_by}", params)
+        while True:
+            rows = cursor.fetchmany(ITER_SONGS_BATCH)
+            if not rows:
+                break
+            for r in rows:
+                yield r
+    finally:
+        conn.close()
+
+
 def get_song_by_path(path):
     conn = get_conn()
     try:
@@ -179,53 +242,135 @@ def set_lyrics_cache(song_path, lrc_text, source=""):
         conn.close()
 
 
-def get_songs_needing_scrape():
+def rename_cover_file(old_file, new_file):
+    conn = get_conn()
+    try:
+        conn.execute(
+            "UPDATE covers SET cover_file = ? WHERE cover_file = ?", (new_file, old_file)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_meta(key):
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+    finally:
+        conn.close()
+
+
+def set_meta(key, value):
+    conn = get_conn()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_songs_needing_scrape(miss_since=None):
+    """缺少歌词或封面的歌曲；传入 miss_since 时排除在该时间之后刮削未找到的歌曲"""
     conn = get_conn()
     try:
-        rows = conn.execute(
-            "SELECT * FROM songs WHERE has_lyrics = 0 OR has_cover = 0"
-        ).fetchall()
+        sql = "SELECT * FROM songs WHERE (has_lyrics = 0 OR has_cover = 0)"
+        params = []
+        if miss_since is not None:
+            sql += (
+                " AND cache_name NOT IN "
+                "(SELECT cache_name FROM scrape_misses WHERE missed_at > ?)"
+            )
+            params.append(miss_since)
+        rows = conn.execute(sql, params).fetchall()
         return [row_to_song(r) for r in rows]
     finally:
         conn.close()
 
 
-def upsert_song(data):
+def set_scrape_miss(cache_name):
     conn = get_conn()
     try:
         conn.execute(
-            """INSERT OR REPLACE INTO songs (
-                path, filename, title, artist, album, file_size, file_mtime,
-                has_cover, has_lyrics,
-                title_initial, artist_initial, album_initial,
-                title_sort, artist_sort, album_sort,
-                updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                data["path"], data["filename"], data["title"], data["artist"],
-                data["album"], data["file_size"], data["file_mtime"],
-                data["has_cover"], data["has_lyrics"],
-                data["title_initial"], data["artist_initial"], data["album_initial"],
-                data["title_sort"], data["artist_sort"], data["album_sort"],
-                time.time(),
-            ),
+            "INSERT OR REPLACE INTO scrape_misses (cache_name, missed_at) VALUES (?, ?)",
+            (cache_name, time.time()),
         )
         conn.commit()
     finally:
         conn.close()
 
 
-def delete_song(path):
+def clear_scrape_miss(cache_name):
     conn = get_conn()
     try:
-        conn.execute("DELETE FROM songs WHERE path = ?", (path,))
-        conn.execute("DELETE FROM lyrics WHERE song_path = ?", (path,))
-        conn.execute("DELETE FROM covers WHERE song_path = ?", (path,))
+        conn.execute("DELETE FROM scrape_misses WHERE cache_name = ?", (cache_name,))
         conn.commit()
     finally:
         conn.close()
 
 
+UPSERT_SONG_SQL = """INSERT OR REPLACE INTO songs (
+    path, filename, title, artist, album, file_bytes, file_mtime,
+    has_cover, has_lyrics,
+    title_initial, artist_initial, album_initial,
+    title_sort, artist_sort, album_sort, cache_name,
+    updated_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def _song_params(data, now):
+    return (
+        data["path"], data["filename"], data["title"], data["artist"],
+        data["album"], data["file_bytes"], data["file_mtime"],
+        data["has_cover"], data["has_lyrics"],
+        data["title_initial"], data["artist_initial"], data["album_initial"],
+        data["title_sort"], data["artist_sort"], data["album_sort"],
+        data.get("cache_name", ""),
+        now,
+    )
+
+
+def upsert_song(data):
+    upsert_songs([data])
+
+
+def upsert_songs(songs):
+    """在一个事务中批量写入歌曲，扫描大量文件时避免每首一次提交"""
+    if not songs:
+        return
+    conn = get_conn()
+    try:
+        now = time.time()
+        with conn:
+            conn.executemany(UPSERT_SONG_SQL, [_song_params(d, now) for d in songs])
+        _bump_data_version()
+    finally:
+        conn.close()
+
+
+def delete_song(path):
+    delete_songs([path])
+
+
+def delete_songs(paths):
+    """在一个事务中批量删除歌曲及其歌词、封面缓存记录"""
+    if not paths:
+        return
+    conn = get_conn()
+    try:
+        params = [(p,) for p in paths]
+        with conn:
+            conn.executemany("DELETE FROM songs WHERE path = ?", params)
+            conn.executemany("DELETE FROM lyrics WHERE song_path = ?", params)
+            conn.executemany("DELETE FROM covers WHERE song_path = ?", params)
+        _bump_data_version()
+    finally:
+        conn.close()
+
+
 def update_song_flag(path, has_cover=None, has_lyrics=None):
     conn = get_conn()
     try:
@@ -243,5 +388,6 @@ def update_song_flag(path, has_cover=None, has_lyrics=None):
             vals.append(path)
             conn.execute(f"UPDATE songs SET {', '.join(sets)} WHERE path = ?", vals)
             conn.commit()
+            _bump_data_version()
     finally:
         conn.close()
@@ -1,39 +1,66 @@
 import os
+import base64
 import re
+import stat
 import hashlib
+import functools
 import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import threading
+import queue
+import itertools
 import time
 import urllib.parse
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import FileResponse, StreamingResponse
+import asyncio
+import multiprocessing
+import tempfile
+import unicodedata
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import mutagen
+from mutagen.flac import FLAC, Picture
+from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4
+from mutagen.oggvorbis import OggVorbis
+from mutagen.wave import WAVE
+import orjson
 from pydantic import BaseModel
 from typing import List, Optional
-from io import BytesIO
 from pypinyin import lazy_pinyin, Style
+from pypinyin.pinyin_dict import pinyin_dict
 import config
 import db
 from db import (
-    init_db, query_songs, get_song_by_path,
+    init_db, query_songs, iter_songs, get_song_by_path,
     get_cover_cache, set_cover_cache,
     get_lyrics_cache, set_lyrics_cache,
-    get_songs_needing_scrape, upsert_song, delete_song,
+    get_songs_needing_scrape, set_scrape_miss, clear_scrape_miss,
+    upsert_songs, delete_songs,
     update_song_flag,
 )
 
-# 网易云音乐 API 配置
+SCRAPE_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# 网易云音乐 API 配置（User-Agent 由 SCRAPE_SESSION 统一设置）
 NETEASE_HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Referer": "http://music.163.com/",
 }
 NETEASE_SEARCH_URL = "http://music.163.com/api/search/get"
 NETEASE_LYRIC_URL = "http://music.163.com/api/song/lyric"
 NETEASE_DETAIL_URL = "http://music.163.com/api/song/detail/"
-NETEASE_SCRAPE_DELAY = 1.0  # 每首歌刮削间隔（秒），避免触发反爬
+
+# 刮削并发与限速：多线程重叠网络等待，全局请求间隔保证不触发反爬
+# 吞吐上限约为 1 / SCRAPE_REQUEST_INTERVAL 次请求每秒，与线程数无关
+SCRAPE_WORKERS = max(1, int(os.environ.get("SCRAPE_WORKERS", "4")))  # 常驻刮削线程数
+SCRAPE_REQUEST_INTERVAL = float(os.environ.get("SCRAPE_REQUEST_INTERVAL", "0.25"))  # 相邻两次外部请求的最小间隔（秒）
 
 LRC_CX_LYRIC_URL = "https://api.lrc.cx/api/v1/lyrics/single"
 LRC_CX_LYRIC_ADV_URL = "https://api.lrc.cx/api/v1/lyrics/advance"
@@ -41,7 +68,33 @@ LRC_CX_COVER_MUSIC_URL = "https://api.lrc.cx/api/v1/cover/music"
 LRC_CX_COVER_ALBUM_URL = "https://api.lrc.cx/api/v1/cover/album"
 LRC_CX_ENABLED = os.environ.get("LRC_CX_ENABLED", "1").lower() in ("1", "true", "yes")
 
-app = FastAPI()
+# 刮削共用的 HTTP 会话：连接池保持 keep-alive，避免每次请求重新握手
+SCRAPE_SESSION = requests.Session()
+SCRAPE_SESSION.headers.update({"User-Agent": SCRAPE_USER_AGENT})
+# 连接失败、限流（429）与服务端错误（5xx）统一在这里指数退避重试，遵循 Retry-After；
+# 重试耗尽后返回最后一次响应，由调用方按状态码处理
+_scrape_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    ),
+)
+SCRAPE_SESSION.mount("https://", _scrape_adapter)
+SCRAPE_SESSION.mount("http://", _scrape_adapter)
+
+@asynccontextmanager
+async def lifespan(app):
+    """应用生命周期：启动时初始化并开始后台索引，退出时停止刮削线程与解析进程池"""
+    startup()
+    yield
+    shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS配置 - 使用正则表达式匹配允许的域名
 # FastAPI 的 allow_origins 不支持 glob 通配符，改用 allow_origin_regex
@@ -72,6 +125,17 @@ COVER_DIR = config.COVER_DIR
 os.makedirs(LYRIC_DIR, exist_ok=True)
 os.makedirs(COVER_DIR, exist_ok=True)
 
+# 元数据解析进程池：mutagen 解析与拼音转换都是纯 Python 的 CPU 工作，用多进程绕开 GIL
+# 使用 spawn 避免在多线程的服务进程里 fork；进程池只在一次扫描期间存在，扫描结束即回收工作进程
+PARSE_POOL_MIN_FILES = 64  # 待解析文件少于该数量时直接在当前线程解析，省去启动进程的开销
+PARSE_POOL_CHUNKSIZE = 64  # 每次分发给工作进程的文件数，减少进程间通信次数
+
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.wav', '.ogg')
+_ALLOWED_EXTS = frozenset(AUDIO_EXTENSIONS)
+
+# 音乐目录的绝对路径只计算一次，每次请求校验路径时直接复用
+_ABS_MUSIC_DIR = os.path.abspath(MUSIC_DIR)
+
 # 路径安全验证函数
 def validate_and_safe_path(user_path: str, base_dir: str = MUSIC_DIR) -> str:
     """
@@ -91,34 +155,43 @@ def validate_and_safe_path(user_path: str, base_dir: str = MUSIC_DIR) -> str:
         # 解码URL编码的路径
         decoded_path = urllib.parse.unquote(user_path)
         
-        # 获取绝对路径
-        abs_user_path = os.path.abspath(decoded_path)
-        abs_base_dir = os.path.abspath(base_dir)
+        # 相对路径按基础目录解析，而不是进程工作目录；绝对路径时 join 直接取用户路径
+        abs_user_path = os.path.abspath(os.path.join(base_dir, decoded_path))
+        abs_base_dir = _ABS_MUSIC_DIR if base_dir == MUSIC_DIR else os.path.abspath(base_dir)
         
-        # 检查路径是否在基础目录内（Windows 上忽略大小写）
-        if not os.path.normcase(abs_user_path).startswith(os.path.normcase(abs_base_dir)):
+        # 按路径组件检查是否在基础目录内（Windows 上忽略大小写），
+        # 避免前缀匹配把 /music-private 误判为 /music 的子路径
+        norm_user_path = os.path.normcase(abs_user_path)
+        norm_base_dir = os.path.normcase(abs_base_dir)
+        try:
+            inside = os.path.commonpath([norm_user_path, norm_base_dir]) == norm_base_dir
+        except ValueError:
+            # Windows 上不同盘符无公共路径
+            inside = False
+        if not inside:
             raise HTTPException(
                 status_code=403, 
                 detail="Access to this path is not allowed"
             )
         
-        # 检查文件是否存在
-        if not os.path.exists(abs_user_path):
+        # 检查文件是否存在（一次 stat 同时判断存在与文件类型）
+        try:
+            st = os.stat(abs_user_path)
+        except OSError:
             raise HTTPException(
                 status_code=404,
                 detail="File not found"
             )
         
         # 检查是否为普通文件（不是目录或特殊文件）
-        if not os.path.isfile(abs_user_path):
+        if not stat.S_ISREG(st.st_mode):
             raise HTTPException(
                 status_code=400,
                 detail="Path must be a file, not a directory"
             )
         
         # 检查文件扩展名（仅限于音乐文件）
-        allowed_extensions = ('.mp3', '.flac', '.m4a', '.wav', '.ogg')
-        if not abs_user_path.lower().endswith(allowed_extensions):
+        if os.path.splitext(abs_user_path)[1].lower() not in _ALLOWED_EXTS:
             raise HTTPException(
                 status_code=400,
                 detail="File type not allowed. Only audio files are permitted"
@@ -145,7 +218,7 @@ class Song(BaseModel):
     title: Optional[str] = None
     artist: Optional[str] = "未知艺术家"
     album: Optional[str] = "未知专辑"
-    size: str = "0 MB"
+    size_bytes: int = 0
     has_cover: bool = False
     has_lyrics: bool = False
     scraped: bool = False
@@ -162,29 +235,102 @@ class SongListResponse(BaseModel):
     page_size: int
     songs: List[Song]
 
+
+@dataclass(frozen=True)
+class CoverMeta:
+    """/api/cover 所需的音频元数据：用于计算缓存文件名的 artist/title，以及是否有内嵌封面"""
+    artist: str
+    title: str
+    has_embedded: bool = False
+
 # --- 工具函数 ---
 def get_cache_filename(artist, title):
-    """生成缓存文件名 hash"""
+    """生成缓存文件名 hash（仅用作文件名，blake2b 比 md5 更快）"""
+    raw = f"{artist}-{title}".strip().lower()
+    # surrogatepass：无法按 UTF-8 解码的文件名（如 GBK）经 scandir 得到代理转义字符，也能得到稳定的文件名
+    return hashlib.blake2b(raw.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+def song_cache_name(song):
+    """歌曲的缓存文件名：优先用索引时预先算好并存入数据库的值，旧数据缺失时现算"""
+    return song.get("cache_name") or get_cache_filename(song.get("artist", "未知艺术家"), song["title"])
+
+def _legacy_cache_filename(artist, title):
+    """旧版本使用的 md5 缓存文件名，仅用于迁移已有缓存"""
     raw = f"{artist}-{title}".strip().lower()
     return hashlib.md5(raw.encode('utf-8')).hexdigest()
 
-def get_file_size_mb(path):
+# 进程的 umask 只能通过设置来读取，在模块加载时（尚未启动其他线程）读取一次
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_file_atomic(path, data):
+    """先写同目录临时文件再 os.replace 到目标路径，读者永远看不到写了一半的缓存文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
     try:
-        size = os.path.getsize(path)
-        return f"{size / (1024 * 1024):.2f} MB"
-    except:
-        return "Unknown"
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp 创建的文件权限为 0600，改回与普通 open 创建一致（受 umask 控制），
+        # 共享/挂载的缓存目录中其他用户和工具仍可读取
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# 多音字的读音取决于所在词组（如“重庆”读 chong），只取开头几个字交给 pypinyin 做词组匹配，
+# 不必转换整个字符串
+INITIAL_PREFIX_LEN = 4
+
+
+# 艺术家、专辑名在曲库中大量重复，首字母与排序键都按字符串缓存
+PINYIN_CACHE_SIZE = 65536
 
+
+def _build_first_letter_table():
+    """汉字码点 -> 拼音首字母；只收录所有读音首字母一致的字，多音字仍交给 lazy_pinyin 按词组判断"""
+    table = {}
+    for codepoint, readings in pinyin_dict.items():
+        # 去掉声调（NFD 分解后首字符即基本字母）
+        letters = {unicodedata.normalize("NFD", r)[0] for r in readings.split(",") if r}
+        if len(letters) == 1:
+            letter = letters.pop()
+            if letter.isascii() and letter.isalpha():
+                table[codepoint] = letter.upper()
+    return table
+
+
+FIRST_LETTER_TABLE = _build_first_letter_table()
+
+
+@functools.lru_cache(maxsize=PINYIN_CACHE_SIZE)
 def get_initials(text: str) -> str:
-    """获取文本的首字母"""
-    if not text or text.strip() == "":
+    """获取文本的首字母（结果按字符串缓存，重复的艺术家/专辑名只转换一次）"""
+    if not text:
         return "#"
-    
-    # 处理中文转拼音首字母
+    text = text.strip()
+    if not text:
+        return "#"
+
+    # ASCII 开头无需拼音转换
+    first_char = text[0]
+    if first_char.isascii():
+        return first_char.upper() if first_char.isalpha() else "#"
+
+    # 读音无歧义的汉字直接查表
+    letter = FIRST_LETTER_TABLE.get(ord(first_char))
+    if letter:
+        return letter
+
+    # 处理中文转拼音首字母（多音字及表外字符）
     try:
         # 获取拼音首字母
         initials = lazy_pinyin(
-            text, 
+            text[:INITIAL_PREFIX_LEN],
             style=Style.FIRST_LETTER,
             strict=False
         )
@@ -198,80 +344,323 @@ def get_initials(text: str) -> str:
     except:
         return "#"
 
+@functools.lru_cache(maxsize=PINYIN_CACHE_SIZE)
 def get_sort_key(text: str) -> str:
-    """生成排序用的键值：基于首字母分组，英文在前，中文在后"""
+    """生成排序用的键值：基于首字母分组，英文在前，中文在后（结果按字符串缓存）"""
     if not text or text.strip() == "":
         return "ZZZZZZ"  # 空值排最后
     
     # 获取首字母
     initial = get_initials(text)
     
+    # 键为纯字符串，可直接按码点比较：SQLite 的 ORDER BY 与前端排序都不需要区域规则
     # 检查第一个字符是否为英文字母
     first_char = text[0]
     if first_char.isalpha() and first_char.isascii():
         # 英文：在首字母后加0确保英文在前
-        return initial + "0" + text.upper()
+        return f"{initial}0{text.upper()}"
     else:
         # 中文：转换为拼音，在首字母后加1确保中文在后
         try:
             pinyin = lazy_pinyin(text, style=Style.NORMAL, strict=False)
-            pinyin_str = "".join(pinyin).upper()
-            return initial + "1" + pinyin_str
+            return f"{initial}1{''.join(pinyin).upper()}"
         except:
-            return initial + "1" + text
+            return f"{initial}1{text}"
 
 
 def sync_index():
-    """后台线程：增量扫描 /music 目录，同步歌曲元数据到 SQLite"""
+    """
+    后台线程：增量扫描 /music 目录，同步歌曲元数据到 SQLite
+    返回 False 表示服务退出导致扫描中途取消（已解析的部分仍已写入）
+    """
     print("[索引] 开始扫描音乐库...")
     t0 = time.time()
 
-    disk_paths = set()
-    for root, dirs, files in os.walk(MUSIC_DIR):
-        for file in files:
-            if file.lower().endswith(('.mp3', '.flac', '.m4a', '.wav', '.ogg')):
-                disk_paths.add(os.path.join(root, file))
+    # 路径 -> stat 结果，遍历时一次拿到 mtime 和 size；同目录的 .lrc 文件顺带收集
+    local_lrcs = set()
+    disk_files = dict(_iter_audio_files(MUSIC_DIR, local_lrcs))
+    disk_paths = set(disk_files)
 
     conn = db.get_conn()
     try:
-        db_rows = conn.execute("SELECT path, file_mtime FROM songs").fetchall()
+        db_rows = conn.execute("SELECT path, file_mtime, file_bytes FROM songs").fetchall()
     finally:
         conn.close()
 
-    db_paths = {row["path"]: row["file_mtime"] for row in db_rows}
+    db_paths = {row["path"]: (row["file_mtime"], row["file_bytes"]) for row in db_rows}
 
+    # 以 (mtime, size) 判断文件是否变化，未变化的文件直接复用数据库中的元数据
     new_or_changed = []
     for path in disk_paths:
         if path not in db_paths:
             new_or_changed.append(path)
         else:
-            try:
-                disk_mtime = os.path.getmtime(path)
-                if abs(disk_mtime - db_paths[path]) > 1:
-                    new_or_changed.append(path)
-            except OSError:
+            db_mtime, db_bytes = db_paths[path]
+            st = disk_files[path]
+            if abs(st.st_mtime - db_mtime) > 1 or st.st_size != db_bytes:
                 new_or_changed.append(path)
 
     deleted = set(db_paths.keys()) - disk_paths
 
-    for path in new_or_changed:
-        try:
-            info = _parse_song_file(path)
-            if info:
-                upsert_song(info)
-        except Exception as e:
-            print(f"[索引] 解析失败 {path}: {e}")
+    stats = [disk_files[path] for path in new_or_changed]
+    parsed = _parse_song_files(new_or_changed, stats)
+    # 缓存目录各列一次，之后用集合判断歌词/封面是否已缓存，不再逐首 stat
+    cached_files = _list_cache_files()
+
+    # 每 INDEX_WRITE_BATCH 首提交一次事务：既避免逐首提交，长时间扫描中途也能看到进度
+    written = 0
+    batch = []
+    for info in parsed:
+        if info:
+            _resolve_cache_flags(info, local_lrcs, cached_files)
+            batch.append(info)
+        if len(batch) >= INDEX_WRITE_BATCH:
+            written += _flush_index_batch(batch)
+            batch = []
+    written += _flush_index_batch(batch)
+
+    if _shutting_down.is_set():
+        print(f"[索引] 服务退出，扫描已取消: 已写入 {written} 首")
+        return False
 
     for path in deleted:
-        delete_song(path)
         print(f"[索引] 已删除: {os.path.basename(path)}")
+    delete_songs(list(deleted))
 
     elapsed = time.time() - t0
-    print(f"[索引] 完成: {len(disk_paths)} 首, 新增/更新 {len(new_or_changed)}, 删除 {len(deleted)}, 耗时 {elapsed:.1f}s")
+    print(f"[索引] 完成: {len(disk_paths)} 首, 新增/更新 {written}, 删除 {len(deleted)}, 耗时 {elapsed:.1f}s")
+    return True
+
+
+INDEX_WRITE_BATCH = 500
+
+# 扫描期间正在使用的解析进程池；服务退出时 shutdown 置位 _shutting_down 并取消尚未开始的任务，
+# 进程池的等待与关闭只由扫描线程中的 with 块完成，避免两个线程同时关闭同一个进程池
+_parse_pool = None
+_shutting_down = threading.Event()
+
+
+def _parse_song_files(paths, stats):
+    """
+    按顺序产出每个文件的解析结果
+    文件较多时交给本次扫描专用的进程池；工作进程异常退出（如解析超大文件时被 OOM 杀掉）时，
+    剩余文件回退到当前线程逐个解析，单个文件的错误仍由 _parse_song_file 自行处理
+    """
+    global _parse_pool
+    done = 0
+    if len(paths) >= PARSE_POOL_MIN_FILES:
+        try:
+            with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+                _parse_pool = pool
+                try:
+                    for info in pool.map(
+                        _parse_song_file, paths, stats, chunksize=PARSE_POOL_CHUNKSIZE
+                    ):
+                        if _shutting_down.is_set():
+                            # shutdown 可能早于 _parse_pool 赋值，这里自行取消剩余任务
+                            pool.shutdown(wait=False, cancel_futures=True)
+                            return
+                        done += 1
+                        yield info
+                finally:
+                    _parse_pool = None
+        except BrokenProcessPool as e:
+            print(f"[索引] 解析进程异常退出，剩余 {len(paths) - done} 首改为逐个解析: {e}")
+        except (CancelledError, RuntimeError):
+            # 服务退出时取消了尚未开始的解析任务（或在提交任务前进程池已关闭）
+            if _shutting_down.is_set():
+                return
+            raise
+
+    for path, st in zip(paths[done:], stats[done:]):
+        if _shutting_down.is_set():
+            return
+        yield _parse_song_file(path, st)
+
+
+def _flush_index_batch(batch):
+    """
+    写入一批歌曲，返回实际写入的数量
+    整批失败时逐首重试，只跳过有问题的歌曲（如 GBK 文件名经 scandir 得到的代理转义字符串，
+    sqlite3 无法编码）
+    """
+    if not batch:
+        return 0
+    try:
+        upsert_songs(batch)
+        return len(batch)
+    except Exception as e:
+        print(f"[索引] 批量写入失败 ({len(batch)} 首)，改为逐首写入: {e}")
+
+    written = 0
+    for info in batch:
+        try:
+            upsert_songs([info])
+            written += 1
+        except Exception as e:
+            print(f"[索引] 写入失败 {info['path']!r}: {e}")
+    return written
+
+
+def _list_cache_files():
+    """返回歌词与封面缓存目录中的文件名集合"""
+    names = set()
+    for cache_dir in (LYRIC_DIR, COVER_DIR):
+        try:
+            names.update(os.listdir(cache_dir))
+        except OSError:
+            pass
+    return names
+
+
+def _resolve_cache_flags(info, local_lrcs, cached_files):
+    """根据遍历时收集的本地 .lrc 和缓存目录文件名集合，补全 has_lyrics / has_cover"""
+    if not info["has_lyrics"]:
+        lrc_path = os.path.splitext(info["path"])[0] + ".lrc"
+        if lrc_path in local_lrcs or info["cache_name"] + ".lrc" in cached_files:
+            info["has_lyrics"] = 1
+    if not info["has_cover"] and info["cache_name"] + ".jpg" in cached_files:
+        info["has_cover"] = 1
+
+
+def _iter_audio_files(root, lrc_paths=None):
+    """
+    递归遍历目录，产出 (音频文件路径, stat 结果)
+    与 os.walk 默认行为一致：不跟随目录符号链接，跳过无法读取的目录
+    传入 lrc_paths 时，顺带把遍历到的 .lrc 文件路径加入该集合
+    """
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_audio_files(entry.path, lrc_paths)
+            elif entry.name.lower().endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                yield entry.path, entry.stat()
+            elif lrc_paths is not None and entry.name.endswith(".lrc"):
+                lrc_paths.add(entry.path)
+        except OSError:
+            continue
+
+
+def _tag_text(value):
+    """标签值转文本：ID3 帧直接 str，Vorbis/MP4 标签取列表第一项"""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return str(value[0]) if value else None
+    return str(value)
+
+
+def _read_id3(audio):
+    tags = audio.tags
+    if not tags:
+        return None, None, None, False
+    return (
+        _tag_text(tags.get('TIT2')),
+        _tag_text(tags.get('TPE1')),
+        _tag_text(tags.get('TALB')),
+        bool(tags.getall('APIC')),
+    )
+
+
+def _read_vorbis(audio):
+    tags = audio.tags
+    has_cover = bool(getattr(audio, 'pictures', None))
+    if not tags:
+        return None, None, None, has_cover
+    return (
+        _tag_text(tags.get('title')),
+        _tag_text(tags.get('artist')),
+        _tag_text(tags.get('album')),
+        has_cover or 'metadata_block_picture' in tags,
+    )
+
+
+def _read_mp4(audio):
+    tags = audio.tags
+    if not tags:
+        return None, None, None, False
+    return (
+        _tag_text(tags.get('\xa9nam')),
+        _tag_text(tags.get('\xa9ART')),
+        _tag_text(tags.get('\xa9alb')),
+        bool(tags.get('covr')),
+    )
+
+
+def _read_generic(audio):
+    """扩展名与实际格式不符时的兜底：逐个探测常见标签键"""
+    title = artist = album = None
+    if 'TIT2' in audio:
+        title = str(audio['TIT2'])
+    elif 'title' in audio:
+        title = str(audio['title'][0])
+    if 'TPE1' in audio:
+        artist = str(audio['TPE1'])
+    elif 'artist' in audio:
+        artist = str(audio['artist'][0])
+    if 'TALB' in audio:
+        album = str(audio['TALB'])
+    elif 'album' in audio:
+        album = str(audio['album'][0])
+
+    has_cover = False
+    tags = getattr(audio, 'tags', None)
+    if tags and any(key.startswith('APIC') or key == 'covr' for key in tags.keys()):
+        has_cover = True
+    if getattr(audio, 'pictures', None):
+        has_cover = True
+    return title, artist, album, has_cover
+
+
+# 按扩展名直接使用对应格式的解析类，省去 mutagen.File 读取文件头逐个格式打分的探测过程
+AUDIO_FILE_TYPES = {
+    '.mp3': MP3,
+    '.wav': WAVE,
+    '.flac': FLAC,
+    '.ogg': OggVorbis,
+    '.m4a': MP4,
+}
+
+
+def open_audio(path):
+    """按扩展名解析音频文件；扩展名与实际格式不符时回退到 mutagen.File 自动识别"""
+    file_type = AUDIO_FILE_TYPES.get(os.path.splitext(path)[1].lower())
+    if file_type is not None:
+        try:
+            return file_type(path)
+        except mutagen.MutagenError:
+            pass
+    return mutagen.File(path)
+
+
+# 按解析出的文件类型选择标签读取方式，每个文件只走一条查找路径；
+# 扩展名与实际格式不符、经 mutagen.File 识别出的文件同样能选对读取方式
+TAG_READERS = {
+    MP3: _read_id3,
+    WAVE: _read_id3,
+    FLAC: _read_vorbis,
+    OggVorbis: _read_vorbis,
+    MP4: _read_mp4,
+}
+
+
+def read_tags(audio):
+    """读取 (title, artist, album, has_cover)，缺失的文本字段为 None"""
+    reader = TAG_READERS.get(type(audio), _read_generic)
+    try:
+        return reader(audio)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return _read_generic(audio)
 
 
-def _parse_song_file(full_path):
-    """解析单个音频文件的元数据，返回字典"""
+def _parse_song_file(full_path, st=None):
+    """解析单个音频文件的元数据，返回字典；st 为遍历时已取得的 stat 结果，可省去一次系统调用"""
     file = os.path.basename(full_path)
     default_title = os.path.splitext(file)[0]
 
@@ -281,7 +670,7 @@ def _parse_song_file(full_path):
         "title": default_title,
         "artist": "未知艺术家",
         "album": "未知专辑",
-        "file_size": "0 MB",
+        "file_bytes": 0,
         "file_mtime": 0.0,
         "has_cover": 0,
         "has_lyrics": 0,
@@ -294,25 +683,22 @@ def _parse_song_file(full_path):
     }
 
     try:
-        data["file_size"] = get_file_size_mb(full_path)
-        data["file_mtime"] = os.path.getmtime(full_path)
+        if st is None:
+            st = os.stat(full_path)
+        data["file_bytes"] = st.st_size
+        data["file_mtime"] = st.st_mtime
 
-        audio = mutagen.File(full_path)
+        audio = open_audio(full_path)
         if audio:
-            if 'TIT2' in audio:
-                data["title"] = str(audio['TIT2'])
-            elif 'title' in audio:
-                data["title"] = str(audio['title'][0])
-
-            if 'TPE1' in audio:
-                data["artist"] = str(audio['TPE1'])
-            elif 'artist' in audio:
-                data["artist"] = str(audio['artist'][0])
-
-            if 'TALB' in audio:
-                data["album"] = str(audio['TALB'])
-            elif 'album' in audio:
-                data["album"] = str(audio['album'][0])
+            title, artist, album, has_cover = read_tags(audio)
+            if title:
+                data["title"] = title
+            if artist:
+                data["artist"] = artist
+            if album:
+                data["album"] = album
+            if has_cover:
+                data["has_cover"] = 1
 
             data["title_initial"] = get_initials(data["title"])
             data["artist_initial"] = get_initials(data["artist"])
@@ -321,32 +707,81 @@ def _parse_song_file(full_path):
             data["artist_sort"] = get_sort_key(data["artist"])
             data["album_sort"] = get_sort_key(data["album"])
 
-            if hasattr(audio, 'tags'):
-                if 'APIC:' in audio.tags or 'APIC' in audio.tags:
-                    data["has_cover"] = 1
-                elif 'covr' in audio.tags:
-                    data["has_cover"] = 1
-            if hasattr(audio, 'pictures') and audio.pictures:
-                data["has_cover"] = 1
+    except Exception as e:
+        print(f"[解析] {file}: {e}")
 
-        lrc_path = os.path.splitext(full_path)[0] + ".lrc"
-        if os.path.exists(lrc_path):
-            data["has_lyrics"] = 1
+    # 缓存文件名随歌曲一起存入数据库，封面/歌词接口与刮削线程直接读取，不再重复计算
+    # 本地/缓存歌词与缓存封面是否存在由 sync_index 统一用集合判断（_resolve_cache_flags）
+    data["cache_name"] = get_cache_filename(data["artist"], data["title"])
 
-        if not data["has_cover"]:
-            cache_name = get_cache_filename(data["artist"], data["title"])
-            if os.path.exists(os.path.join(COVER_DIR, cache_name + ".jpg")):
-                data["has_cover"] = 1
+    return data
 
-        if not data["has_lyrics"]:
-            cache_name = get_cache_filename(data["artist"], data["title"])
-            if os.path.exists(os.path.join(LYRIC_DIR, cache_name + ".lrc")):
-                data["has_lyrics"] = 1
+_rate_lock = threading.Lock()
+_rate_next_at = 0.0
 
-    except Exception as e:
-        print(f"[解析] {file}: {e}")
 
-    return data
+def _wait_rate_limit():
+    """全局限速：无论多少刮削线程，相邻两次外部请求至少间隔 SCRAPE_REQUEST_INTERVAL 秒"""
+    global _rate_next_at
+    with _rate_lock:
+        now = time.monotonic()
+        delay = _rate_next_at - now
+        _rate_next_at = max(now, _rate_next_at) + SCRAPE_REQUEST_INTERVAL
+    if delay > 0:
+        time.sleep(delay)
+
+
+# 记录当前刮削线程本轮是否有请求失败（连接错误、超时、重试后仍为 5xx/429，或网易云 JSON code 报错）。
+# 各 _fetch_* 函数对失败与“未找到”都返回空结果，靠这个标记区分两者
+_scrape_local = threading.local()
+
+
+def _http_get(url, **kwargs):
+    """刮削用 GET 请求，复用 SCRAPE_SESSION 连接池并统一经过全局限速"""
+    _wait_rate_limit()
+    try:
+        resp = SCRAPE_SESSION.get(url, **kwargs)
+    except requests.RequestException:
+        _scrape_local.request_failed = True
+        raise
+    if resp.status_code == 429 or resp.status_code >= 500:
+        _scrape_local.request_failed = True
+    return resp
+
+
+def migrate_cache_filenames():
+    """
+    将旧版 md5 命名的歌词/封面缓存文件重命名为 blake2b 命名（只执行一次）
+    依据数据库中已索引歌曲的 artist/title 计算新旧文件名，并同步更新 covers 表中的路径
+    """
+    if db.get_meta("cache_name_hash") == "blake2b":
+        return
+
+    conn = db.get_conn()
+    try:
+        rows = conn.execute("SELECT DISTINCT artist, title FROM songs").fetchall()
+    finally:
+        conn.close()
+
+    moved = 0
+    for row in rows:
+        old_name = _legacy_cache_filename(row["artist"], row["title"])
+        new_name = get_cache_filename(row["artist"], row["title"])
+        for cache_dir, ext in ((LYRIC_DIR, ".lrc"), (COVER_DIR, ".jpg")):
+            old_file = os.path.join(cache_dir, old_name + ext)
+            new_file = os.path.join(cache_dir, new_name + ext)
+            try:
+                if os.path.exists(old_file) and not os.path.exists(new_file):
+                    os.replace(old_file, new_file)
+                    moved += 1
+                    if ext == ".jpg":
+                        db.rename_cover_file(old_file, new_file)
+            except OSError as e:
+                print(f"[迁移] {old_file}: {e}")
+
+    db.set_meta("cache_name_hash", "blake2b")
+    print(f"[迁移] 缓存文件名迁移完成: 重命名 {moved} 个文件")
+
 
 def _normalize_text(text):
     """规范化文本：去除括号内容、多余空格、统一小写，用于匹配比较"""
@@ -421,7 +856,7 @@ def _search_netease(artist, title, album=""):
     best_all = None
     for query in queries:
         try:
-            resp = requests.get(
+            resp = _http_get(
                 NETEASE_SEARCH_URL,
                 params={"s": query, "type": 1, "limit": 15},
                 headers=NETEASE_HEADERS,
@@ -432,6 +867,8 @@ def _search_netease(artist, title, album=""):
 
             data = resp.json()
             if data.get("code") != 200:
+                # 网易云限流/反爬时仍返回 HTTP 200，只在 JSON code 中报错（如 -460），不能当作“未找到”
+                _scrape_local.request_failed = True
                 continue
 
             songs = data.get("result", {}).get("songs", [])
@@ -453,77 +890,60 @@ def _search_netease(artist, title, album=""):
 
 
 def _fetch_lyrics_netease(song_id):
-    """根据 song_id 获取 LRC 歌词，失败时重试一次"""
-    for attempt in range(2):
-        try:
-            resp = requests.get(
-                NETEASE_LYRIC_URL,
-                params={"id": song_id, "lv": 1, "tv": -1},
-                headers=NETEASE_HEADERS,
-                timeout=10
-            )
-            if resp.status_code != 200:
-                if attempt == 0:
-                    time.sleep(0.5)
-                    continue
-                return ""
+    """根据 song_id 获取 LRC 歌词（连接失败/5xx/429 由 SCRAPE_SESSION 自动重试）"""
+    try:
+        resp = _http_get(
+            NETEASE_LYRIC_URL,
+            params={"id": song_id, "lv": 1, "tv": -1},
+            headers=NETEASE_HEADERS,
+            timeout=10
+        )
+        if resp.status_code != 200:
+            return ""
 
-            data = resp.json()
-            lrc = data.get("lrc", {}).get("lyric", "")
-            if not lrc:
-                return ""
-            return lrc
+        data = resp.json()
+        if data.get("code", 200) != 200:
+            _scrape_local.request_failed = True
+            return ""
+        return data.get("lrc", {}).get("lyric", "") or ""
 
-        except Exception as e:
-            if attempt == 0:
-                time.sleep(0.5)
-                continue
-            print(f"[歌词获取失败] song_id={song_id}: {e}")
+    except Exception as e:
+        print(f"[歌词获取失败] song_id={song_id}: {e}")
 
     return ""
 
 
 def _fetch_cover_netease(song_id, cover_save_path):
-    """根据 song_id 下载封面图片到本地，失败时重试一次"""
-    for attempt in range(2):
-        try:
-            resp = requests.get(
-                NETEASE_DETAIL_URL,
-                params={"id": song_id, "ids": f"[{song_id}]"},
-                headers=NETEASE_HEADERS,
-                timeout=10
-            )
-            if resp.status_code != 200:
-                if attempt == 0:
-                    time.sleep(0.5)
-                    continue
-                return False
-
-            data = resp.json()
-            songs_list = data.get("songs", [])
-            if not songs_list:
-                return False
-
-            pic_url = songs_list[0].get("album", {}).get("picUrl", "")
-            if not pic_url:
-                return False
+    """根据 song_id 下载封面图片到本地（连接失败/5xx/429 由 SCRAPE_SESSION 自动重试）"""
+    try:
+        resp = _http_get(
+            NETEASE_DETAIL_URL,
+            params={"id": song_id, "ids": f"[{song_id}]"},
+            headers=NETEASE_HEADERS,
+            timeout=10
+        )
+        if resp.status_code != 200:
+            return False
 
-            img_resp = requests.get(pic_url, headers=NETEASE_HEADERS, timeout=15)
-            if img_resp.status_code == 200 and "image" in img_resp.headers.get("content-type", ""):
-                with open(cover_save_path, 'wb') as f:
-                    f.write(img_resp.content)
-                return True
+        data = resp.json()
+        if data.get("code", 200) != 200:
+            _scrape_local.request_failed = True
+            return False
+        songs_list = data.get("songs", [])
+        if not songs_list:
+            return False
 
-            if attempt == 0:
-                time.sleep(0.5)
-                continue
+        pic_url = songs_list[0].get("album", {}).get("picUrl", "")
+        if not pic_url:
             return False
 
-        except Exception as e:
-            if attempt == 0:
-                time.sleep(0.5)
-                continue
-            print(f"[封面获取失败] song_id={song_id}: {e}")
+        img_resp = _http_get(pic_url, headers=NETEASE_HEADERS, timeout=15)
+        if img_resp.status_code == 200 and "image" in img_resp.headers.get("content-type", ""):
+            write_file_atomic(cover_save_path, img_resp.content)
+            return True
+
+    except Exception as e:
+        print(f"[封面获取失败] song_id={song_id}: {e}")
 
     return False
 
@@ -538,7 +958,7 @@ def _fetch_lyrics_lrc(title, artist, album=""):
     if album and album != "未知专辑":
         params["album"] = album
     try:
-        resp = requests.get(LRC_CX_LYRIC_URL, params=params, timeout=10)
+        resp = _http_get(LRC_CX_LYRIC_URL, params=params, timeout=10)
         if resp.status_code == 200 and resp.text.strip():
             return resp.text.strip()
     except Exception as e:
@@ -556,7 +976,7 @@ def _fetch_cover_lrc(title, artist, album="", cover_save_path=""):
     if album and album != "未知专辑":
         params["album"] = album
     try:
-        resp = requests.get(LRC_CX_COVER_MUSIC_URL, params=params, timeout=10)
+        resp = _http_get(LRC_CX_COVER_MUSIC_URL, params=params, timeout=10)
         if resp.status_code == 200:
             data = resp.json()
             img_url = data.get("img", "")
@@ -570,7 +990,7 @@ def _fetch_cover_lrc(title, artist, album="", cover_save_path=""):
             p = {"album": album}
             if artist and artist != "未知艺术家":
                 p["artist"] = artist
-            resp = requests.get(LRC_CX_COVER_ALBUM_URL, params=p, timeout=10)
+            resp = _http_get(LRC_CX_COVER_ALBUM_URL, params=p, timeout=10)
             if resp.status_code == 200:
                 data = resp.json()
                 img_url = data.get("img", "")
@@ -584,21 +1004,15 @@ def _fetch_cover_lrc(title, artist, album="", cover_save_path=""):
 
 def _download_cover_img(img_url, save_path):
     try:
-        r = requests.get(img_url, headers=NETEASE_HEADERS, timeout=15)
+        r = _http_get(img_url, headers=NETEASE_HEADERS, timeout=15)
         if r.status_code == 200 and "image" in r.headers.get("content-type", ""):
-            with open(save_path, 'wb') as f:
-                f.write(r.content)
+            write_file_atomic(save_path, r.content)
             return True
     except Exception as e:
         print(f"[下载封面] {img_url[:60]}: {e}")
     return False
 
 
-# --- 刮削去重锁 ---
-_scrape_in_progress = False
-_scrape_lock = threading.Lock()
-
-
 # --- 刮削逻辑（四级回退） ---
 
 def _scrape_one_song(song):
@@ -615,7 +1029,7 @@ def _scrape_one_song(song):
     artist = song.get("artist", "未知艺术家")
     album = song.get("album", "未知专辑")
 
-    cache_name = get_cache_filename(artist, title)
+    cache_name = song_cache_name(song)
     lrc_file = os.path.join(LYRIC_DIR, cache_name + ".lrc")
     cover_file = os.path.join(COVER_DIR, cache_name + ".jpg")
 
@@ -635,8 +1049,7 @@ def _scrape_one_song(song):
         if need_lyrics:
             lrc = _fetch_lyrics_netease(ne["id"])
             if lrc:
-                with open(lrc_file, 'w', encoding='utf-8') as f:
-                    f.write(lrc)
+                write_file_atomic(lrc_file, lrc.encode('utf-8'))
                 set_lyrics_cache(song["path"], lrc, source="netease")
                 update_song_flag(song["path"], has_lyrics=True)
                 result["lyrics"] = True
@@ -652,8 +1065,7 @@ def _scrape_one_song(song):
         if need_lyrics and not result["lyrics"]:
             lrc = _fetch_lyrics_lrc(title, artist, album)
             if lrc:
-                with open(lrc_file, 'w', encoding='utf-8') as f:
-                    f.write(lrc)
+                write_file_atomic(lrc_file, lrc.encode('utf-8'))
                 set_lyrics_cache(song["path"], lrc, source="lrc.cx")
                 update_song_flag(song["path"], has_lyrics=True)
                 result["lyrics"] = True
@@ -673,8 +1085,7 @@ def _scrape_one_song(song):
             if need_lyrics and not result["lyrics"]:
                 lrc = _fetch_lyrics_netease(ne2["id"])
                 if lrc:
-                    with open(lrc_file, 'w', encoding='utf-8') as f:
-                        f.write(lrc)
+                    write_file_atomic(lrc_file, lrc.encode('utf-8'))
                     set_lyrics_cache(song["path"], lrc, source="netease")
                     update_song_flag(song["path"], has_lyrics=True)
                     result["lyrics"] = True
@@ -691,8 +1102,7 @@ def _scrape_one_song(song):
         if need_lyrics and not result["lyrics"]:
             lrc = _fetch_lyrics_lrc(title, artist)
             if lrc:
-                with open(lrc_file, 'w', encoding='utf-8') as f:
-                    f.write(lrc)
+                write_file_atomic(lrc_file, lrc.encode('utf-8'))
                 set_lyrics_cache(song["path"], lrc, source="lrc.cx")
                 update_song_flag(song["path"], has_lyrics=True)
                 result["lyrics"] = True
@@ -706,39 +1116,141 @@ def _scrape_one_song(song):
     cover_ok = "✓" if result["cover"] else "✗"
     chain = " → ".join(tried)
     print(f"[刮削] {title} - {artist} 歌词{lyric_ok} 封面{cover_ok} [{chain}]")
-
-    time.sleep(NETEASE_SCRAPE_DELAY)
     return result
 
 
-def scrape_metadata_background(songs_list):
+# --- 刮削队列：常驻工作线程消费，索引与按需刮削都只负责入队 ---
+SCRAPE_PRIORITY_ON_DEMAND = 0  # 用户正在播放的歌曲，插队处理
+SCRAPE_PRIORITY_BACKGROUND = 1  # 启动时批量补全
+SCRAPE_PRIORITY_STOP = -1  # 退出信号，排在所有刮削任务之前
+
+SCRAPE_QUEUE = queue.PriorityQueue()
+_scrape_seq = itertools.count()  # 同优先级按入队顺序处理，也避免比较 song 字典
+_scrape_workers_started = False
+_scrape_workers_lock = threading.Lock()
+_scrape_worker_threads = []
+
+# 去重：按缓存文件名（即 artist+title）判断，同一首歌的多个副本只请求一次
+SCRAPE_NEGATIVE_TTL = 3600  # 刮削未找到歌词/封面后，多久内不再重复请求（秒）
+# 未找到的记录同时写入数据库：重启后的后台全量刮削在该时长内跳过这些歌曲（秒）；
+# 手动触发的刮削只受上面的内存记录限制
+SCRAPE_MISS_TTL = 30 * 86400
+_scrape_pending = {}  # 已入队等待刮削：cache_name -> 有效队列项的 (优先级, 序号)
+_scrape_active = set()  # 正在刮削
+_scrape_negative = {}  # cache_name -> 过期时间（time.monotonic）
+_scrape_dedup_lock = threading.Lock()
+
+
+def _scrape_worker():
+    """常驻刮削线程：逐个取出队列中的歌曲刮削，请求频率由 _wait_rate_limit 统一控制"""
+    while True:
+        priority, seq, song = SCRAPE_QUEUE.get()
+        if song is None:
+            # 退出信号
+            SCRAPE_QUEUE.task_done()
+            return
+        cache_name = song_cache_name(song)
+        with _scrape_dedup_lock:
+            if _scrape_pending.get(cache_name) != (priority, seq):
+                # 已被更高优先级的队列项取代（按需刮削插队），跳过这条旧记录
+                SCRAPE_QUEUE.task_done()
+                continue
+            del _scrape_pending[cache_name]
+            _scrape_active.add(cache_name)
+        found_all = False
+        # 只有所有来源都正常应答时，“未找到”才可信；网络未就绪或接口故障时不记录未找到，
+        # 以免整批歌曲被误判并在 SCRAPE_MISS_TTL 内被跳过
+        answered = False
+        _scrape_local.request_failed = False
+        try:
+            result = _scrape_one_song(song)
+            found_all = result["lyrics"] and result["cover"]
+            answered = not _scrape_local.request_failed
+        except Exception as e:
+            print(f"[刮削] {song.get('title')}: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            with _scrape_dedup_lock:
+                _scrape_active.discard(cache_name)
+                if not found_all and answered:
+                    _scrape_negative[cache_name] = time.monotonic() + SCRAPE_NEGATIVE_TTL
+            try:
+                if found_all:
+                    clear_scrape_miss(cache_name)
+                elif answered:
+                    set_scrape_miss(cache_name)
+            except Exception as e:
+                print(f"[刮削] 记录刮削结果失败: {e}")
+            SCRAPE_QUEUE.task_done()
+
+
+def start_scrape_workers():
+    """启动 SCRAPE_WORKERS 个常驻刮削线程（重复调用无副作用）"""
+    global _scrape_workers_started
+    with _scrape_workers_lock:
+        if _scrape_workers_started:
+            return
+        _scrape_workers_started = True
+        for i in range(SCRAPE_WORKERS):
+            t = threading.Thread(target=_scrape_worker, name=f"scrape-{i}", daemon=True)
+            t.start()
+            _scrape_worker_threads.append(t)
+
+
+def stop_scrape_workers(timeout=5):
     """
-    后台线程：遍历所有歌曲，通过网易云音乐 API 下载歌词和封面
-    使用全局锁确保同时只有一个刮削线程在运行
+    让所有刮削线程在当前歌曲完成后退出：退出信号的优先级高于任何刮削任务，
+    队列中剩余的歌曲不再处理（下次启动时会重新入队）
     """
-    global _scrape_in_progress
-    print(f"[刮削] 启动，待处理: {len(songs_list)} 首")
-
-    try:
-        for song in songs_list:
-            _scrape_one_song(song)
-
-        print("[刮削] 全部完成")
-
-    except Exception as e:
-        print(f"[刮削] 线程异常: {e}")
-        import traceback
-        traceback.print_exc()
-
-    finally:
-        with _scrape_lock:
-            _scrape_in_progress = False
+    global _scrape_workers_started
+    with _scrape_workers_lock:
+        if not _scrape_workers_started:
+            return
+        _scrape_workers_started = False
+        workers = list(_scrape_worker_threads)
+        _scrape_worker_threads.clear()
+    for _ in workers:
+        SCRAPE_QUEUE.put((SCRAPE_PRIORITY_STOP, next(_scrape_seq), None))
+    deadline = time.monotonic() + timeout
+    for t in workers:
+        t.join(max(0, deadline - time.monotonic()))
+
+
+def enqueue_scrape(song, priority=SCRAPE_PRIORITY_BACKGROUND):
+    """
+    把歌曲放入刮削队列，立即返回
+    同一 artist+title 正在刮削、已以不低于本次的优先级排队，或近期刮削未找到时跳过，返回 False；
+    已在队列中但优先级更低时（如启动时批量入队的歌曲被用户点播），以新优先级重新入队，
+    旧的队列项由工作线程取出时丢弃
+    """
+    if not song.get("title"):
+        return False
+    cache_name = song_cache_name(song)
+    now = time.monotonic()
+    with _scrape_dedup_lock:
+        if cache_name in _scrape_active:
+            return False
+        pending = _scrape_pending.get(cache_name)
+        if pending is not None:
+            if priority >= pending[0]:
+                return False
+        else:
+            expires = _scrape_negative.get(cache_name)
+            if expires is not None:
+                if expires > now:
+                    return False
+                del _scrape_negative[cache_name]
+        seq = next(_scrape_seq)
+        _scrape_pending[cache_name] = (priority, seq)
+        SCRAPE_QUEUE.put((priority, seq, song))
+    return True
 
 
 @app.get("/api/scrape")
 def scrape_song(path: str = Query(..., description="歌曲文件路径")):
     """
-    按需刮削单首歌曲的歌词和封面（后台线程执行，立即返回）
+    按需刮削单首歌曲的歌词和封面（优先放入刮削队列，立即返回）
 
     Args:
         path: 经过URL编码的音乐文件路径
@@ -758,52 +1270,88 @@ def scrape_song(path: str = Query(..., description="歌曲文件路径")):
     if not need_lyrics and not need_cover:
         return {"accepted": False, "reason": "已有歌词和封面"}
 
-    def _bg_scrape():
-        _scrape_one_song(song_row)
-
-    threading.Thread(target=_bg_scrape, daemon=True).start()
+    if not enqueue_scrape(song_row, priority=SCRAPE_PRIORITY_ON_DEMAND):
+        return {"accepted": False, "reason": "正在刮削或近期未找到"}
     return {"accepted": True, "reason": "已提交后台刮削"}
 
 
 # --- 核心接口 ---
 
-# 启动事件：初始化数据库 + 后台同步索引
+# 启动：初始化数据库 + 后台同步索引（由 lifespan 调用）
 _scanned = False
 
 
-@app.on_event("startup")
 def startup():
     global _scanned
     init_db()
     print("[启动] 数据库初始化完成")
+    start_scrape_workers()
 
     def _index_then_scrape():
         global _scanned
-        sync_index()
+        migrate_cache_filenames()
+        if not sync_index():
+            return
         _scanned = True
-        need = get_songs_needing_scrape()
+        need = get_songs_needing_scrape(miss_since=time.time() - SCRAPE_MISS_TTL)
         if need:
-            print(f"[启动] 触发刮削: {len(need)} 首缺少歌词或封面")
-            global _scrape_in_progress
-            with _scrape_lock:
-                if not _scrape_in_progress:
-                    _scrape_in_progress = True
-                    t = threading.Thread(
-                        target=scrape_metadata_background,
-                        args=(need,),
-                        daemon=True,
-                    )
-                    t.start()
+            print(f"[启动] 触发刮削: {len(need)} 首缺少歌词或封面，并发 {SCRAPE_WORKERS}")
+            for song in need:
+                enqueue_scrape(song)
 
     threading.Thread(target=_index_then_scrape, daemon=True).start()
 
 
+def shutdown():
+    """退出：通知刮削线程结束，取消尚未开始的解析任务（进程池由扫描线程自行关闭）"""
+    _shutting_down.set()
+    stop_scrape_workers()
+    pool = _parse_pool
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+    print("[退出] 后台任务已停止")
+
+
+# /api/songs 结果缓存：歌曲表未变化（db 数据版本号不变）时直接复用上次的结果
+_songs_cache = {}
+_songs_cache_version = -1
+_songs_cache_lock = threading.Lock()
+SONGS_CACHE_MAX_ENTRIES = 128
+
+
+# response_model 仅用于生成接口文档：接口直接返回已编码的 JSON 响应，
+# FastAPI 不再对成千上万首歌逐个做返回值校验和序列化
 @app.get("/api/songs", response_model=SongListResponse)
-def get_songs(
+async def get_songs(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(0, ge=0, description="每页数量，0 表示返回全部"),
     search: str = Query("", description="搜索关键词（匹配文件名、标题、艺术家）"),
 ):
+    global _songs_cache_version
+    cache_key = (search, page, page_size)
+    version = db.get_data_version()
+    with _songs_cache_lock:
+        if _songs_cache_version != version:
+            _songs_cache.clear()
+            _songs_cache_version = version
+        cached = _songs_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    # 缓存命中直接在事件循环中返回；未命中时 SQLite 查询与组装放到线程池，不阻塞事件循环
+    loop = asyncio.get_running_loop()
+    body = await loop.run_in_executor(None, _build_song_list, search, page, page_size)
+    # 缓存的是编码后的 JSON 字节，命中时不再做任何序列化
+    with _songs_cache_lock:
+        if _songs_cache_version == version:
+            if len(_songs_cache) >= SONGS_CACHE_MAX_ENTRIES:
+                _songs_cache.clear()
+            _songs_cache[cache_key] = body
+    return Response(content=body, media_type="application/json")
+
+
+def _build_song_list(search, page, page_size):
+    """从数据库查询歌曲，按 SongListResponse 的结构组装并用 orjson 编码为 JSON 字节"""
     sort_by = "title"
     sort_order = "asc"
 
@@ -812,35 +1360,76 @@ def get_songs(
         page=page, page_size=page_size,
     )
 
-    songs = []
-    for row in db_songs:
-        song = Song(
-            path=row["path"],
-            filename=row["filename"],
-            title=row["title"],
-            artist=row["artist"],
-            album=row["album"],
-            size=row["file_size"],
-            has_cover=bool(row["has_cover"]),
-            has_lyrics=bool(row["has_lyrics"]),
-            title_initial=row["title_initial"],
-            artist_initial=row["artist_initial"],
-            album_initial=row["album_initial"],
-            title_sort=row["title_sort"],
-            artist_sort=row["artist_sort"],
-            album_sort=row["album_sort"],
-        )
-        songs.append(song)
+    songs = [_song_row_to_dict(row) for row in db_songs]
 
     final_total = total
     final_page_size = page_size if page_size > 0 else total
 
-    return SongListResponse(
-        total=final_total,
-        page=page,
-        page_size=final_page_size,
-        songs=songs,
-    )
+    return orjson.dumps({
+        "total": final_total,
+        "page": page,
+        "page_size": final_page_size,
+        "songs": songs,
+    })
+
+
+def _song_row_to_dict(row):
+    """
+    索引行 -> Song 结构的字典
+    数据来自自己写入的索引，字段类型已确定，直接组装字典，不经过 Pydantic
+    """
+    return {
+        "path": row["path"],
+        "filename": row["filename"],
+        "title": row["title"],
+        "artist": row["artist"],
+        "album": row["album"],
+        "size_bytes": row["file_bytes"],
+        "has_cover": bool(row["has_cover"]),
+        "has_lyrics": bool(row["has_lyrics"]),
+        "scraped": False,
+        "title_initial": row["title_initial"],
+        "artist_initial": row["artist_initial"],
+        "album_initial": row["album_initial"],
+        "title_sort": row["title_sort"],
+        "artist_sort": row["artist_sort"],
+        "album_sort": row["album_sort"],
+    }
+
+
+@app.get("/api/songs/stream")
+def stream_songs(
+    search: str = Query("", description="搜索关键词（匹配文件名、标题、艺术家）"),
+):
+    """
+    以 NDJSON 流式返回歌曲列表：每行一个 Song 对象，边查询边发送
+    大曲库下客户端无需等待整个列表组装完成即可开始渲染；排序与 /api/songs 一致
+    """
+    def _lines():
+        for row in iter_songs(search=search, sort_by="title", sort_order="asc"):
+            yield orjson.dumps(_song_row_to_dict(row)) + b"\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+# 音频与封面文件的浏览器缓存策略：内容随文件变化，配合 ETag 重新验证
+MEDIA_CACHE_CONTROL = "public, max-age=604800"
+
+AUDIO_MEDIA_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.flac': 'audio/flac',
+    '.m4a': 'audio/mp4',
+    '.wav': 'audio/wav',
+    '.ogg': 'audio/ogg'
+}
+
+
+class AudioFileResponse(FileResponse):
+    """
+    音频文件响应：每次读取 1 MiB（默认 64 KiB），大体积 FLAC 的读/发送系统调用次数更少
+    Range 请求由 Starlette 处理（>= 0.39）：拖动进度条时只返回 206 所需区间，不会重发整个文件
+    """
+    chunk_size = 1024 * 1024
+
 
 @app.get("/api/stream")
 def stream_music(path: str = Query(..., description="歌曲文件路径")):
@@ -851,31 +1440,122 @@ def stream_music(path: str = Query(..., description="歌曲文件路径")):
         path: 经过URL编码的音乐文件路径
         
     Returns:
-        FileResponse: 音频文件流
+        FileResponse: 音频文件流（支持 Range，返回 206 部分内容）
     """
     # 验证路径安全性
     safe_path = validate_and_safe_path(path)
     
     # 根据文件扩展名确定媒体类型
     ext = os.path.splitext(safe_path)[1].lower()
-    media_types = {
-        '.mp3': 'audio/mpeg',
-        '.flac': 'audio/flac',
-        '.m4a': 'audio/mp4',
-        '.wav': 'audio/wav',
-        '.ogg': 'audio/ogg'
-    }
+    media_type = AUDIO_MEDIA_TYPES.get(ext, 'audio/mpeg')
     
-    media_type = media_types.get(ext, 'audio/mpeg')
-    
-    return FileResponse(
+    return AudioFileResponse(
         safe_path, 
         media_type=media_type, 
-        filename=os.path.basename(safe_path)
+        filename=os.path.basename(safe_path),
+        headers={"Cache-Control": MEDIA_CACHE_CONTROL},
     )
 
+# 默认封面：模块加载时编码一次，所有请求共享同一个 bytes 对象
+DEFAULT_COVER_SVG = b"""<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="#334155">
+        <path d="M12 2C6.48 2 2 6.48 2 12s4.48 10 10 10 10-4.48 10-10S17.52 2 12 2zm0 14.5c-2.49 0-4.5-2.01-4.5-4.5S9.51 7.5 12 7.5s4.5 2.01 4.5 4.5-2.01 4.5-4.5 4.5zm0-5.5c-.55 0-1 .45-1 1s.45 1 1 1 1-.45 1-1-.45-1-1-1z"/>
+    </svg>"""
+# 同一封面 URL 在刮削完成后会返回真实封面，默认封面不能标记为 immutable，只短时间缓存
+DEFAULT_COVER_CACHE_CONTROL = "public, max-age=3600"
+
+# 元数据缓存：只存 artist/title 与是否有内嵌封面，不存图片数据
+# 内嵌封面首次取出后即落盘并记入 covers 表，之后的请求不会再走到这里
+COVER_META_CACHE_SIZE = 2048
+_cover_meta_cache = {}
+_cover_meta_cache_lock = threading.Lock()
+
+
+def _extract_embedded_cover(audio):
+    """从已解析的 mutagen 对象中取出内嵌封面，返回 (图片数据, mime)，没有则返回 (None, None)"""
+    tags = getattr(audio, 'tags', None)
+    if tags:
+        # ID3 按帧 ID 索引，getall 直接取所有 APIC 帧，无需线性扫描全部标签键
+        pics = tags.getall('APIC') if hasattr(tags, 'getall') else []
+        if pics:
+            return pics[0].data, pics[0].mime
+        if 'covr' in tags:
+            return bytes(tags['covr'][0]), "image/jpeg"
+        if 'metadata_block_picture' in tags:
+            # Ogg Vorbis/Opus：封面以 base64 编码的 FLAC PICTURE 块存放在注释字段中
+            try:
+                pic = Picture(base64.b64decode(tags['metadata_block_picture'][0]))
+                return pic.data, pic.mime or "image/jpeg"
+            except (ValueError, TypeError, mutagen.MutagenError):
+                pass
+    if hasattr(audio, 'pictures') and audio.pictures:
+        pic = audio.pictures[0]
+        return pic.data, pic.mime
+    return None, None
+
+
+def _parse_cover_meta(path):
+    """解析一次音频文件，返回 (CoverMeta, 内嵌封面数据, mime)"""
+    artist = "未知艺术家"
+    title = os.path.splitext(os.path.basename(path))[0]
+    embedded, mime = None, None
+
+    try:
+        audio = open_audio(path)
+        if audio:
+            tag_title, tag_artist, _, _ = read_tags(audio)
+            title = tag_title or title
+            artist = tag_artist or artist
+            embedded, mime = _extract_embedded_cover(audio)
+    except Exception as e:
+        print(f"[警告] 读取音频文件失败: {e}")
+
+    meta = CoverMeta(artist=artist, title=title, has_embedded=bool(embedded))
+    return meta, embedded, mime or "image/jpeg"
+
+
+def _load_cover_meta(path):
+    """
+    返回 (CoverMeta, 内嵌封面数据, mime)
+    结果按 (path, mtime_ns) 缓存，文件修改后自动失效；无内嵌封面的文件命中缓存时不再解析，
+    有内嵌封面时需要图片数据，仍解析一次
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime_ns = 0
+    key = (path, mtime_ns)
+
+    with _cover_meta_cache_lock:
+        meta = _cover_meta_cache.get(key)
+    if meta is not None and not meta.has_embedded:
+        return meta, None, None
+
+    meta, embedded, mime = _parse_cover_meta(path)
+    with _cover_meta_cache_lock:
+        if len(_cover_meta_cache) >= COVER_META_CACHE_SIZE:
+            _cover_meta_cache.clear()
+        _cover_meta_cache[key] = meta
+    return meta, embedded, mime
+
+
+def _cached_file_response(request, file_path, media_type=None):
+    """
+    返回带 ETag / Cache-Control 的文件响应
+    ETag 由文件 mtime 与大小生成，If-None-Match 命中时直接返回 304，不发送文件内容
+    """
+    st = os.stat(file_path)
+    etag = f'W/"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(file_path, media_type=media_type, headers=headers, stat_result=st)
+
+
 @app.get("/api/cover")
-def get_cover(path: str = Query(..., description="歌曲文件路径")):
+def get_cover(request: Request, path: str = Query(..., description="歌曲文件路径")):
     """
     获取歌曲封面
 
@@ -883,91 +1563,58 @@ def get_cover(path: str = Query(..., description="歌曲文件路径")):
         path: 经过URL编码的音乐文件路径
 
     Returns:
-        StreamingResponse: 图片数据流
+        FileResponse: 图片文件（无封面时返回默认 SVG）
     """
     safe_path = validate_and_safe_path(path)
 
     # 1. 从数据库缓存查询
     cached_cover = get_cover_cache(safe_path)
     if cached_cover:
-        return FileResponse(cached_cover)
+        return _cached_file_response(request, cached_cover)
 
-    # 2. 尝试读取文件内嵌封面 + 同时解析元数据
-    artist = "未知艺术家"
-    title = os.path.splitext(os.path.basename(safe_path))[0]
+    # 2. 索引中已有 artist/title：直接定位刮削封面文件，无需解析音频文件
+    song_row = get_song_by_path(safe_path)
+    if song_row:
+        cached_file = os.path.join(COVER_DIR, song_cache_name(song_row) + ".jpg")
+        if os.path.exists(cached_file):
+            set_cover_cache(safe_path, cached_file, source="scraped")
+            return _cached_file_response(request, cached_file)
+
+    # 3. 解析一次音频文件，优先使用内嵌封面
+    meta, embedded, mime = _load_cover_meta(safe_path)
+    cache_name = get_cache_filename(meta.artist, meta.title)
+    cached_file = os.path.join(COVER_DIR, cache_name + ".jpg")
 
-    try:
-        audio = mutagen.File(safe_path)
-        if audio:
-            if 'TIT2' in audio:
-                title = str(audio['TIT2'])
-            elif 'title' in audio:
-                title = str(audio['title'][0])
-            if 'TPE1' in audio:
-                artist = str(audio['TPE1'])
-            elif 'artist' in audio:
-                artist = str(audio['artist'][0])
-
-            if hasattr(audio, 'tags'):
-                for key in audio.tags.keys():
-                    if key.startswith('APIC'):
-                        pic = audio.tags[key]
-                        # 写入数据库缓存
-                        cache_name = get_cache_filename(artist, title)
-                        cached_file = os.path.join(COVER_DIR, cache_name + ".jpg")
-                        try:
-                            with open(cached_file, 'wb') as f:
-                                f.write(pic.data)
-                            set_cover_cache(safe_path, cached_file, source="embedded")
-                        except Exception as e:
-                            print(f"[警告] 缓存内嵌封面失败: {e}")
-                        return StreamingResponse(BytesIO(pic.data), media_type=pic.mime)
-                if 'covr' in audio.tags:
-                    pic_data = audio.tags['covr'][0]
-                    cache_name = get_cache_filename(artist, title)
-                    cached_file = os.path.join(COVER_DIR, cache_name + ".jpg")
-                    try:
-                        with open(cached_file, 'wb') as f:
-                            f.write(pic_data)
-                        set_cover_cache(safe_path, cached_file, source="embedded")
-                    except Exception as e:
-                        print(f"[警告] 缓存内嵌封面失败: {e}")
-                    return StreamingResponse(BytesIO(pic_data), media_type="image/jpeg")
-            if hasattr(audio, 'pictures') and audio.pictures:
-                pic = audio.pictures[0]
-                cache_name = get_cache_filename(artist, title)
-                cached_file = os.path.join(COVER_DIR, cache_name + ".jpg")
-                try:
-                    with open(cached_file, 'wb') as f:
-                        f.write(pic.data)
-                    set_cover_cache(safe_path, cached_file, source="embedded")
-                except Exception as e:
-                    print(f"[警告] 缓存内嵌封面失败: {e}")
-                return StreamingResponse(BytesIO(pic.data), media_type=pic.mime)
-    except Exception as e:
-        print(f"[警告] 读取音频文件失败: {e}")
+    if embedded:
+        # 内嵌封面落盘后用 FileResponse 返回（可走 sendfile），并写入数据库缓存，
+        # 之后的请求在第 1 步直接命中，不再解析音频文件
+        try:
+            write_file_atomic(cached_file, embedded)
+            set_cover_cache(safe_path, cached_file, source="embedded")
+            return _cached_file_response(request, cached_file, media_type=mime)
+        except Exception as e:
+            print(f"[警告] 缓存内嵌封面失败: {e}")
+        return Response(content=embedded, media_type=mime)
 
-    # 3. 尝试查找文件缓存封面
-    cache_name = get_cache_filename(artist, title)
-    cached_file = os.path.join(COVER_DIR, cache_name + ".jpg")
+    # 4. 不在索引中的文件：按解析出的元数据查找文件缓存封面
     if os.path.exists(cached_file):
         # 写入数据库缓存
         set_cover_cache(safe_path, cached_file, source="scraped")
-        return FileResponse(cached_file)
-
-    # 4. 都没有，返回默认封面
-    default_cover_svg = """<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="#334155">
-        <path d="M12 2C6.48 2 2 6.48 2 12s4.48 10 10 10 10-4.48 10-10S17.52 2 12 2zm0 14.5c-2.49 0-4.5-2.01-4.5-4.5S9.51 7.5 12 7.5s4.5 2.01 4.5 4.5-2.01 4.5-4.5 4.5zm0-5.5c-.55 0-1 .45-1 1s.45 1 1 1 1-.45 1-1-.45-1-1-1z"/>
-    </svg>"""
+        return _cached_file_response(request, cached_file)
 
-    return StreamingResponse(
-        BytesIO(default_cover_svg.encode('utf-8')),
+    # 5. 都没有，返回默认封面
+    return Response(
+        content=DEFAULT_COVER_SVG,
         media_type="image/svg+xml",
-        headers={"Cache-Control": "max-age=3600"}
+        headers={"Cache-Control": DEFAULT_COVER_CACHE_CONTROL},
     )
 
+# 找到的歌词允许浏览器短时间缓存；未找到时不缓存，后台刮削完成后可立即取到
+LYRICS_CACHE_CONTROL = "public, max-age=300"
+
+
 @app.get("/api/lyrics")
-def get_lyrics(path: str = Query(..., description="歌曲文件路径")):
+def get_lyrics(response: Response, path: str = Query(..., description="歌曲文件路径")):
     """
     按需获取歌词内容
 
@@ -982,6 +1629,7 @@ def get_lyrics(path: str = Query(..., description="歌曲文件路径")):
     # 1. 从数据库缓存查询
     db_lrc = get_lyrics_cache(safe_path)
     if db_lrc:
+        response.headers["Cache-Control"] = LYRICS_CACHE_CONTROL
         return {"lyrics": db_lrc}
 
     # 2. 尝试读取同目录下的 .lrc 文件
@@ -991,6 +1639,7 @@ def get_lyrics(path: str = Query(..., description="歌曲文件路径")):
             with open(lrc_path, 'r', encoding='utf-8', errors='ignore') as f:
                 lrc_text = f.read()
                 set_lyrics_cache(safe_path, lrc_text, source="local")
+                response.headers["Cache-Control"] = LYRICS_CACHE_CONTROL
                 return {"lyrics": lrc_text}
         except Exception as e:
             print(f"[警告] 读取本地歌词失败: {e}")
@@ -998,19 +1647,16 @@ def get_lyrics(path: str = Query(..., description="歌曲文件路径")):
     # 3. 尝试读取文件缓存歌词（从 DB 取元数据，避免重复解析 mutagen）
     song_row = get_song_by_path(safe_path)
     if song_row:
-        artist = song_row["artist"]
-        title = song_row["title"]
+        cache_name = song_cache_name(song_row)
     else:
-        artist = "未知艺术家"
-        title = os.path.splitext(os.path.basename(safe_path))[0]
-
-    cache_name = get_cache_filename(artist, title)
+        cache_name = get_cache_filename("未知艺术家", os.path.splitext(os.path.basename(safe_path))[0])
     cached_lrc = os.path.join(LYRIC_DIR, cache_name + ".lrc")
     if os.path.exists(cached_lrc):
         try:
             with open(cached_lrc, 'r', encoding='utf-8') as f:
                 lrc_text = f.read()
                 set_lyrics_cache(safe_path, lrc_text, source="scraped")
+                response.headers["Cache-Control"] = LYRICS_CACHE_CONTROL
                 return {"lyrics": lrc_text}
         except Exception as e:
             print(f"[警告] 读取缓存歌词失败: {e}")